@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Find large blocks of boilerplate repeated across Strapi post content.
+
+WordPress leftovers (and the HTML inlined by replace_shortcodes.py) repeat the
+same markup in many posts. This script finds those repeated fragments, ranks
+them by the total bytes they occupy in the corpus, and proposes marker rules
+that replace_shortcodes_v2.py could use to collapse them.
+
+Fragments are found with a rolling hash: windows whose hash hits a sampling
+condition become anchors, anchors shared between posts are verified and then
+extended left and right as far as every occurrence agrees. Each fragment is
+then trimmed to balanced HTML tags and WordPress block comments.
+"""
+import re
+import sys
+import json
+import hashlib
+import os.path
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent))
+
+from replace_shortcodes_v2 import (  # noqa: E402
+    Post,
+    STRAPI_URL,
+    fetch_all_posts,
+    load_posts_snapshot,
+    save_posts_snapshot,
+)
+
+# Rolling hash parameters (polynomial hash modulo a Mersenne prime)
+HASH_BASE = 257
+HASH_MOD = (1 << 61) - 1
+
+# Window length (in characters) used to seed candidate fragments
+WINDOW = 64
+
+# Only windows whose hash is divisible by this become anchors. Identical text
+# always yields identical anchors, so repeated blocks are still found while
+# the number of anchors to compare stays small.
+SAMPLE_RATE = 16
+
+# Fragments smaller than this (in bytes) are not reported
+MIN_BYTES = 256
+
+# Elements that never have a closing tag
+VOID_ELEMENTS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+    'link', 'meta', 'source', 'track', 'wbr',
+}
+
+# Comments, complete tags, text, and stray brackets from cut-off tags
+TOKEN_PATTERN = re.compile(r'<!--.*?-->|<[^<>]*>|[^<>]+|[<>]', re.DOTALL)
+
+# Namespace for proposed markers. BlogContent.tsx turns podcast-subscribe,
+# youtube and audio markers into components, so proposals must never reuse
+# those names.
+MARKER_NAMESPACE = 'boilerplate'
+
+# Known markup signatures used to describe a fragment in its marker
+MARKER_HINTS = [
+    ('open.spotify.com', 'spotify'),
+    ('youtube.com', 'youtube'),
+    ('buzzsprout.com', 'buzzsprout'),
+    ('<iframe', 'embed'),
+    ('<svg', 'icon'),
+    ('<!-- wp:', 'wp-block'),
+]
+
+
+def find_anchors(text: str, window: int = WINDOW, sample_rate: int = SAMPLE_RATE) -> List[Tuple[int, int]]:
+    """Return (hash, position) for every sampled window in text."""
+    if len(text) < window:
+        return []
+
+    # BASE^(window-1), used to drop the leading character
+    high = pow(HASH_BASE, window - 1, HASH_MOD)
+
+    h = 0
+    for ch in text[:window]:
+        h = (h * HASH_BASE + ord(ch)) % HASH_MOD
+
+    anchors = []
+    if h % sample_rate == 0:
+        anchors.append((h, 0))
+
+    for i in range(1, len(text) - window + 1):
+        h = (h - ord(text[i - 1]) * high) % HASH_MOD
+        h = (h * HASH_BASE + ord(text[i + window - 1])) % HASH_MOD
+        if h % sample_rate == 0:
+            anchors.append((h, i))
+
+    return anchors
+
+
+def extend_fragment(contents: List[str], occurrences: List[Tuple[int, int]], window: int) -> Tuple[int, int]:
+    """Extend a shared window as far as all occurrences agree.
+
+    Returns (left, right): how many characters the fragment extends before
+    and after the start of each occurrence.
+    """
+    # Common prefix of everything after the anchor
+    right = len(os.path.commonprefix([contents[d][p:] for d, p in occurrences]))
+
+    # Common prefix of everything before the anchor, read backwards
+    left = len(os.path.commonprefix([contents[d][:p][::-1] for d, p in occurrences]))
+
+    return left, max(right, window)
+
+
+def drop_overlaps(occurrences: List[Tuple[int, int]], length: int) -> List[Tuple[int, int]]:
+    """Drop occurrences that overlap an earlier one in the same post."""
+    kept = []
+    last_end: Dict[int, int] = {}
+    for doc, pos in sorted(occurrences):
+        if pos < last_end.get(doc, -1):
+            continue
+        kept.append((doc, pos))
+        last_end[doc] = pos + length
+    return kept
+
+
+def is_covered(covered: Dict[int, List[Tuple[int, int, int]]], doc: int, start: int, end: int, count: int) -> bool:
+    """Check if [start, end) lies inside an already-found fragment seen at least `count` times."""
+    for frag_start, frag_end, frag_count in covered.get(doc, []):
+        if frag_start <= start and end <= frag_end and frag_count >= count:
+            return True
+    return False
+
+
+def find_repeated_blocks(
+    contents: List[str],
+    min_bytes: int = MIN_BYTES,
+    window: int = WINDOW,
+    sample_rate: int = SAMPLE_RATE,
+) -> List[Dict]:
+    """Find fragments repeated across contents, largest total bytes first.
+
+    Each result holds the fragment text, its size, the number of occurrences
+    and the indexes of the posts it appears in.
+    """
+    # Group sampled windows by hash across the whole corpus
+    buckets: Dict[int, List[Tuple[int, int]]] = defaultdict(list)
+    for doc, text in enumerate(contents):
+        for h, pos in find_anchors(text, window, sample_rate):
+            buckets[h].append((doc, pos))
+
+    covered: Dict[int, List[Tuple[int, int, int]]] = defaultdict(list)
+    candidates: List[Tuple[str, List[Tuple[int, int]]]] = []
+
+    # Larger buckets first so the widest-spread fragments claim their text
+    for occurrences in sorted(buckets.values(), key=len, reverse=True):
+        if len(occurrences) < 2:
+            continue
+
+        # Verify the windows really match (guards against hash collisions)
+        by_text: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        for doc, pos in occurrences:
+            by_text[contents[doc][pos:pos + window]].append((doc, pos))
+
+        for group in by_text.values():
+            group = drop_overlaps(group, window)
+            if len(group) < 2:
+                continue
+
+            doc, pos = group[0]
+            if is_covered(covered, doc, pos, pos + window, len(group)):
+                continue
+
+            left, right = extend_fragment(contents, group, window)
+            text = contents[doc][pos - left:pos + right]
+
+            group = drop_overlaps([(d, p - left) for d, p in group], len(text))
+            if len(group) < 2:
+                continue
+
+            for d, p in group:
+                covered[d].append((p, p + len(text), len(group)))
+
+            if len(text.encode('utf-8')) >= min_bytes:
+                candidates.append((text, group))
+
+    return remove_nested(candidates, min_bytes)
+
+
+def classify_token(token: str) -> Tuple[str, Optional[str]]:
+    """Classify a markup token as ('open'|'close', name), ('neutral', None) or ('partial', None)."""
+    if token.startswith('<!--'):
+        inner = token[4:-3].strip()
+        if inner.startswith('/wp:'):
+            return 'close', 'wp:' + inner[4:].split()[0]
+        if inner.startswith('wp:') and not inner.endswith('/'):
+            return 'open', 'wp:' + inner[3:].split()[0]
+        return 'neutral', None
+
+    if token.startswith('<') and token.endswith('>'):
+        match = re.match(r'<(/?)([a-zA-Z][\w:-]*)', token)
+        if not match:
+            # Doctype, processing instruction, etc.
+            return 'neutral', None
+        name = match.group(2).lower()
+        if match.group(1):
+            return 'close', name
+        if token.endswith('/>') or name in VOID_ELEMENTS:
+            return 'neutral', None
+        return 'open', name
+
+    if '<' in token or '>' in token:
+        # Stray bracket from a tag cut off at the fragment edge
+        return 'partial', None
+    return 'neutral', None
+
+
+def balanced_span(text: str) -> Tuple[int, int]:
+    """Return (start, end) of the longest balanced-markup span in text.
+
+    Fragment edges usually fall mid-tag or mid-block (e.g. a previous
+    paragraph's closing </p>). A span is kept only if every tag and WordPress
+    block comment it opens is also closed inside it, so replacing it cannot
+    break the surrounding markup. Returns (0, 0) if there is none.
+    """
+    tokens = [(m.start(), m.end(), classify_token(m.group(0))) for m in TOKEN_PATTERN.finditer(text)]
+
+    best = (0, 0)
+    for i, (start, _, (kind, _)) in enumerate(tokens):
+        if kind in ('close', 'partial'):
+            continue
+        if len(text) - start <= best[1] - best[0]:
+            break
+
+        stack: List[str] = []
+        for _, end, (kind, name) in tokens[i:]:
+            if kind == 'partial':
+                break
+            if kind == 'open':
+                stack.append(name)
+            elif kind == 'close':
+                if not stack or stack[-1] != name:
+                    break
+                stack.pop()
+            if not stack and end - start > best[1] - best[0]:
+                best = (start, end)
+
+    # Don't count surrounding whitespace as part of the fragment
+    start, end = best
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def remove_nested(candidates: List[Tuple[str, List[Tuple[int, int]]]], min_bytes: int) -> List[Dict]:
+    """Report each repeated span once, largest total bytes first.
+
+    A fragment found inside a longer but rarer one (block A in 10 posts, A+B
+    in 3) would otherwise be counted twice. Candidates are visited from most
+    to least frequent and each keeps only the parts not already claimed by a
+    more frequent fragment, so A+B is reported as just B.
+    """
+    claimed: Dict[int, List[Tuple[int, int]]] = defaultdict(list)
+    positions: Dict[str, set] = defaultdict(set)
+
+    for text, group in sorted(candidates, key=lambda c: (len(c[1]), len(c[0])), reverse=True):
+        length = len(text)
+
+        # Offsets within the fragment left unclaimed in every occurrence
+        free = [True] * length
+        for doc, pos in group:
+            for start, end in claimed[doc]:
+                lo, hi = max(start, pos) - pos, min(end, pos + length) - pos
+                if lo < hi:
+                    free[lo:hi] = [False] * (hi - lo)
+
+        offset = 0
+        while offset < length:
+            if not free[offset]:
+                offset += 1
+                continue
+            end = offset
+            while end < length and free[end]:
+                end += 1
+            # Trim to balanced markup so a rule for the segment is safe to apply
+            trim_start, trim_end = balanced_span(text[offset:end])
+            segment = text[offset + trim_start:offset + trim_end]
+            if len(segment.encode('utf-8')) >= min_bytes:
+                positions[segment].update((doc, pos + offset + trim_start) for doc, pos in group)
+            offset = end
+
+        for doc, pos in group:
+            claimed[doc].append((pos, pos + length))
+
+    fragments = []
+    for text, occurrences in positions.items():
+        size = len(text.encode('utf-8'))
+        fragments.append({
+            'text': text,
+            'bytes': size,
+            'occurrences': len(occurrences),
+            'total_bytes': size * len(occurrences),
+            'posts': sorted({doc for doc, _ in occurrences}),
+        })
+
+    return sorted(fragments, key=lambda f: f['total_bytes'], reverse=True)
+
+
+def suggest_marker_name(text: str) -> str:
+    """Describe a fragment based on recognizable markup in it."""
+    for needle, name in MARKER_HINTS:
+        if needle in text:
+            return name
+    return 'block'
+
+
+def propose_marker_rule(fragment: Dict) -> Dict:
+    """Build a replacement rule for a fragment in the style of replace_shortcodes_v2.py."""
+    text = fragment['text']
+    digest = hashlib.sha256(text.encode('utf-8')).hexdigest()[:8]
+    name = suggest_marker_name(text)
+
+    # Tolerate whitespace differences, as the v2 HTML patterns do
+    tokens = text.split()
+    pattern = r'\s*'.join(re.escape(token) for token in tokens)
+
+    return {
+        'name': f'{name}-{digest}',
+        'marker': f'{{{{{MARKER_NAMESPACE}:{name}-{digest}}}}}',
+        'pattern': pattern,
+        'flags': 'DOTALL',
+        'bytes': fragment['bytes'],
+        'occurrences': fragment['occurrences'],
+        'total_bytes': fragment['total_bytes'],
+    }
+
+
+def preview(text: str, width: int = 100) -> str:
+    """Single-line preview of a fragment."""
+    flat = ' '.join(text.split())
+    return flat if len(flat) <= width else flat[:width - 3] + '...'
+
+
+def get_arg(flag: str) -> Optional[str]:
+    """Return the value following a command line flag, if present."""
+    for i, arg in enumerate(sys.argv):
+        if arg == flag and i + 1 < len(sys.argv):
+            return sys.argv[i + 1]
+    return None
+
+
+def main():
+    """Main analysis logic."""
+    snapshot_path = get_arg('--snapshot')
+    save_path = get_arg('--save-snapshot')
+    rules_path = get_arg('--rules-out')
+    slug_filter = get_arg('--filter')
+    min_bytes = int(get_arg('--min-bytes') or MIN_BYTES)
+    top = int(get_arg('--top') or 20)
+
+    print("=" * 60)
+    print("Repeated Boilerplate Analysis")
+    print("=" * 60)
+
+    if snapshot_path:
+        print(f"📂 Loading snapshot: {snapshot_path}")
+        posts = load_posts_snapshot(snapshot_path)
+    else:
+        print(f"📥 Fetching posts from Strapi ({STRAPI_URL})...")
+        posts = fetch_all_posts(slug_filter)
+        if save_path:
+            save_posts_snapshot(save_path, posts)
+            print(f"   Saved snapshot to {save_path}")
+    print(f"   Found {len(posts)} posts\n")
+
+    records = [Post.from_strapi(post) for post in posts]
+    titles = [record.title for record in records]
+    contents = [record.content for record in records]
+
+    corpus_bytes = sum(len(c.encode('utf-8')) for c in contents)
+    print(f"🔍 Scanning {corpus_bytes:,} bytes of content...")
+    fragments = find_repeated_blocks(contents, min_bytes=min_bytes)
+    print(f"   Found {len(fragments)} repeated fragments of {min_bytes}+ bytes\n")
+
+    rules = []
+    for rank, fragment in enumerate(fragments[:top], 1):
+        rule = propose_marker_rule(fragment)
+        rules.append(rule)
+
+        share = 100 * fragment['total_bytes'] / corpus_bytes if corpus_bytes else 0
+        print(f"[{rank}] {fragment['bytes']:,} bytes x {fragment['occurrences']} = "
+              f"{fragment['total_bytes']:,} bytes ({share:.1f}% of corpus)")
+        print(f"   Posts: {len(fragment['posts'])} (e.g. {titles[fragment['posts'][0]]})")
+        print(f"   Preview: {preview(fragment['text'])}")
+        print(f"   Proposed marker: {rule['marker']}")
+        print()
+
+    # Print summary
+    repeated_bytes = sum(f['total_bytes'] for f in fragments)
+    print("=" * 60)
+    print("Summary")
+    print("=" * 60)
+    print(f"Corpus size: {corpus_bytes:,} bytes")
+    print(f"Repeated fragments: {len(fragments)}")
+    print(f"Bytes in repeated fragments: {repeated_bytes:,}")
+
+    if rules_path:
+        with open(rules_path, 'w', encoding='utf-8') as f:
+            json.dump(rules, f, ensure_ascii=False, indent=2)
+        print(f"\n📝 Wrote {len(rules)} proposed marker rule(s) to {rules_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Generate responsive image derivatives and rewrite post images to use them.
+
+Scans post content (and local upload directories) for images, generates
+resized AVIF/WebP variants in a process pool and rewrites <img> tags in post
+content to srcset form with the same rewrite pipeline as the shortcode
+replacements.
+
+Variants are named after a hash of the source file, so re-runs skip images
+that were already processed and identical uploads share one set of files.
+Everything can run against a local snapshot and local directories.
+"""
+import os
+import re
+import sys
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+from PIL import Image, ImageOps, features
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent))
+
+from replace_shortcodes_v2 import (  # noqa: E402
+    Post,
+    STRAPI_URL,
+    fetch_all_posts,
+    load_posts_snapshot,
+    save_posts_snapshot,
+    transform_post_content,
+    update_post,
+)
+
+# Source formats to process (GIFs are skipped so animations survive)
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+# Strapi stores resized copies of every upload under these prefixes. They
+# are skipped when scanning upload directories (the stage generates its own
+# sizes from the original) but still processed if a post references one.
+STRAPI_FORMAT_PREFIXES = ('thumbnail_', 'small_', 'medium_', 'large_')
+
+# Target widths in pixels; images are never upscaled
+DERIVATIVE_WIDTHS = (480, 960, 1440)
+
+# Output formats in order of preference. The last available one goes in the
+# <img> srcset; earlier ones become <picture> sources.
+DERIVATIVE_FORMATS = ('avif', 'webp')
+
+MIME_TYPES = {
+    'avif': 'image/avif',
+    'webp': 'image/webp',
+}
+
+DERIVATIVE_QUALITY = 80
+
+# Matches the prose column width of blog posts
+IMG_SIZES = '(max-width: 768px) 100vw, 768px'
+
+DEFAULT_UPLOAD_DIRS = ['public']
+DEFAULT_OUT_DIR = 'public/images/derivatives'
+DEFAULT_URL_PREFIX = '/images/derivatives'
+
+# Dry run mode - won't actually update Strapi
+DRY_RUN = True
+
+IMG_TAG_PATTERN = r'<img\s[^>]*>'
+SRC_PATTERN = r'\ssrc="([^"]+)"'
+
+# An <img> optionally wrapped in a link. Migrated WordPress image links point
+# at the wrong images and BlogContent.tsx strips them from bare <img> tags;
+# that no longer matches once the image is inside <picture>, so the rewrite
+# drops the link itself.
+LINKED_IMG_PATTERN = r'<a\s+[^>]*href="[^"]*"[^>]*>\s*(<img\s[^>]*>)\s*</a>|(<img\s[^>]*>)'
+
+
+def find_image_refs(content: str) -> List[str]:
+    """Return the src of every <img> tag in content."""
+    refs = []
+    for tag in re.findall(IMG_TAG_PATTERN, content, re.IGNORECASE):
+        match = re.search(SRC_PATTERN, tag)
+        if match:
+            refs.append(match.group(1))
+    return refs
+
+
+def is_within(path: Path, directory: Path) -> bool:
+    """Check if path lies inside directory (both resolved)."""
+    return path == directory or directory in path.parents
+
+
+def scan_upload_dirs(upload_dirs: List[Path], out_dir: Path) -> List[Path]:
+    """Return all source images under the upload directories.
+
+    out_dir is skipped so the stage never treats its own variants as sources,
+    and Strapi's own format copies (thumbnail_, small_, ...) are skipped.
+    """
+    out_dir = out_dir.resolve()
+    images = []
+    for upload_dir in upload_dirs:
+        for path in sorted(upload_dir.rglob('*')):
+            if (path.is_file() and path.suffix.lower() in IMAGE_EXTENSIONS
+                    and not path.name.startswith(STRAPI_FORMAT_PREFIXES)
+                    and not is_within(path.resolve(), out_dir)):
+                images.append(path)
+    return images
+
+
+def resolve_image(src: str, upload_dirs: List[Path], out_dir: Path) -> Optional[Path]:
+    """Map an image URL from post content to a local file, if one exists.
+
+    Files inside out_dir (generated variants) are never returned.
+    """
+    path = unquote(urlparse(src).path).lstrip('/')
+    if not path or Path(path).suffix.lower() not in IMAGE_EXTENSIONS:
+        return None
+
+    for upload_dir in upload_dirs:
+        candidate = upload_dir / path
+        if candidate.is_file() and not is_within(candidate.resolve(), out_dir.resolve()):
+            return candidate
+    return None
+
+
+def available_formats() -> List[str]:
+    """Output formats supported by the installed Pillow build."""
+    return [fmt for fmt in DERIVATIVE_FORMATS if features.check(fmt)]
+
+
+def file_key(path: Path) -> str:
+    """Hash of the file contents, used to name its derivatives."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def generate_derivatives(
+    path: Path,
+    out_dir: Path,
+    widths: Tuple[int, ...],
+    formats: List[str],
+) -> Dict[str, List[Tuple[int, str]]]:
+    """Create resized variants of one image, skipping ones that already exist.
+
+    Returns {format: [(width, filename), ...]} ordered by width.
+    """
+    key = file_key(path)
+    variants: Dict[str, List[Tuple[int, str]]] = {fmt: [] for fmt in formats}
+
+    with Image.open(path) as opened:
+        # Apply EXIF orientation so rotated camera photos come out upright
+        image = ImageOps.exif_transpose(opened)
+
+        # Convert before resizing: palette images would otherwise resize with
+        # NEAREST, and P/LA images keep transparency in info['transparency']
+        # rather than an alpha band
+        if image.mode not in ('RGB', 'RGBA'):
+            has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+
+        orig_width, orig_height = image.size
+        targets = [w for w in widths if w < orig_width] or [orig_width]
+
+        for fmt in formats:
+            for width in targets:
+                filename = f'{key}-{width}.{fmt}'
+                variants[fmt].append((width, filename))
+
+                out_path = out_dir / filename
+                if out_path.exists():
+                    continue
+
+                height = max(1, round(orig_height * width / orig_width))
+                resized = image.resize((width, height), Image.Resampling.LANCZOS)
+
+                # Write to a temporary name so an interrupted run never
+                # leaves a partial file that later runs would skip. The name
+                # is per process because identical uploads share a key and
+                # may be processed in parallel.
+                tmp_path = out_dir / f'.{filename}.{os.getpid()}.tmp'
+                resized.save(tmp_path, format=fmt.upper(), quality=DERIVATIVE_QUALITY)
+                os.replace(tmp_path, out_path)
+
+    return variants
+
+
+def try_generate_derivatives(
+    path: Path,
+    out_dir: Path,
+    widths: Tuple[int, ...],
+    formats: List[str],
+) -> Tuple[Optional[Dict[str, List[Tuple[int, str]]]], Optional[str]]:
+    """Run generate_derivatives, returning (variants, error) instead of raising.
+
+    One unreadable or corrupt upload should not abort the whole batch.
+    """
+    try:
+        return generate_derivatives(path, out_dir, widths, formats), None
+    except Exception as e:
+        return None, f'{type(e).__name__}: {e}'
+
+
+def build_srcset(variants: List[Tuple[int, str]], url_prefix: str) -> str:
+    """Format (width, filename) pairs as a srcset attribute value."""
+    return ', '.join(f'{url_prefix}/{filename} {width}w' for width, filename in variants)
+
+
+def replace_img_srcset(
+    content: str,
+    derivatives: Dict[str, Dict[str, List[Tuple[int, str]]]],
+    url_prefix: str = DEFAULT_URL_PREFIX,
+) -> Tuple[str, int]:
+    """Rewrite <img> tags with known derivatives to srcset form.
+
+    Tags that already have a srcset are left alone, so the rewrite is
+    idempotent. A link wrapping a rewritten image is removed, matching what
+    the frontend does for bare images.
+    """
+    count = 0
+
+    def create_srcset_tag(match):
+        nonlocal count
+        tag = match.group(1) or match.group(2)
+        if 'srcset=' in tag:
+            return match.group(0)
+
+        src = re.search(SRC_PATTERN, tag)
+        if not src or src.group(1) not in derivatives:
+            return match.group(0)
+
+        variants = derivatives[src.group(1)]
+        *source_formats, img_format = list(variants)
+
+        img = tag.replace(
+            src.group(0),
+            f'{src.group(0)} srcset="{build_srcset(variants[img_format], url_prefix)}" sizes="{IMG_SIZES}"',
+            1,
+        )
+
+        count += 1
+        if not source_formats:
+            return img
+
+        sources = ''.join(
+            f'<source type="{MIME_TYPES[fmt]}" srcset="{build_srcset(variants[fmt], url_prefix)}" sizes="{IMG_SIZES}">'
+            for fmt in source_formats
+        )
+        return f'<picture>{sources}{img}</picture>'
+
+    new_content = re.sub(LINKED_IMG_PATTERN, create_srcset_tag, content, flags=re.IGNORECASE)
+    return new_content, count
+
+
+def get_args(flag: str) -> List[str]:
+    """Return every value following a (repeatable) command line flag."""
+    return [sys.argv[i + 1] for i, arg in enumerate(sys.argv[:-1]) if arg == flag]
+
+
+def get_arg(flag: str) -> Optional[str]:
+    """Return the value following a command line flag, if present."""
+    values = get_args(flag)
+    return values[0] if values else None
+
+
+def main():
+    """Main derivative generation and rewrite logic."""
+    global DRY_RUN
+
+    # Check for --execute flag
+    if '--execute' in sys.argv:
+        DRY_RUN = False
+        print("⚠️  LIVE MODE: Rewritten content will be written to Strapi")
+    else:
+        print("🔍 DRY RUN MODE: No changes will be made to Strapi")
+        print("   Run with --execute to apply changes\n")
+
+    snapshot_path = get_arg('--snapshot')
+    save_path = get_arg('--save-snapshot')
+    slug_filter = get_arg('--filter')
+    upload_dirs = [Path(d) for d in (get_args('--upload-dir') or DEFAULT_UPLOAD_DIRS)]
+    out_dir = Path(get_arg('--out') or DEFAULT_OUT_DIR)
+    url_prefix = (get_arg('--url-prefix') or DEFAULT_URL_PREFIX).rstrip('/')
+
+    formats = available_formats()
+    if not formats:
+        print("❌ Error: installed Pillow supports neither AVIF nor WebP")
+        sys.exit(1)
+
+    print("=" * 60)
+    print("Responsive Image Derivatives")
+    print("=" * 60)
+    print(f"Upload dirs: {', '.join(str(d) for d in upload_dirs)}")
+    print(f"Output: {out_dir} ({url_prefix})")
+    print(f"Formats: {', '.join(formats)}")
+    print(f"Widths: {', '.join(str(w) for w in DERIVATIVE_WIDTHS)}")
+    print()
+
+    if snapshot_path:
+        print(f"📂 Loading snapshot: {snapshot_path}")
+        posts = [Post.from_strapi(post) for post in load_posts_snapshot(snapshot_path)]
+    else:
+        print(f"📥 Fetching posts from Strapi ({STRAPI_URL})...")
+        posts = [Post.from_strapi(post) for post in fetch_all_posts(slug_filter)]
+    print(f"   Found {len(posts)} posts\n")
+
+    # Collect every local image: those referenced by posts and all uploads
+    print("🔍 Scanning for images...")
+    refs: Dict[str, Path] = {}
+    unresolved = 0
+    for post in posts:
+        for src in find_image_refs(post.content):
+            path = resolve_image(src, upload_dirs, out_dir)
+            if path:
+                refs[src] = path
+            else:
+                unresolved += 1
+
+    sources = sorted({p.resolve() for p in scan_upload_dirs(upload_dirs, out_dir)} | {p.resolve() for p in refs.values()})
+    print(f"   Image references in posts: {len(refs)} resolved, {unresolved} not found locally")
+    print(f"   Source images: {len(sources)}\n")
+
+    print("🖼️  Generating derivatives...")
+    out_dir.mkdir(parents=True, exist_ok=True)
+    existing = len(list(out_dir.iterdir()))
+    generate = partial(try_generate_derivatives, out_dir=out_dir, widths=DERIVATIVE_WIDTHS, formats=formats)
+    by_path: Dict[Path, Dict[str, List[Tuple[int, str]]]] = {}
+    failed: List[Path] = []
+    with ProcessPoolExecutor() as executor:
+        for path, (variants, error) in zip(sources, executor.map(generate, sources)):
+            if error:
+                print(f"   ❌ {path}: {error}")
+                failed.append(path)
+            else:
+                by_path[path] = variants
+    created = len(list(out_dir.iterdir())) - existing
+    print(f"   Created {created} new variant file(s)\n")
+
+    # Rewrite <img> tags through the shared transform pipeline; images that
+    # failed to process keep their original tags
+    derivatives = {src: by_path[path.resolve()] for src, path in refs.items() if path.resolve() in by_path}
+    replacers = [('images', partial(replace_img_srcset, derivatives=derivatives, url_prefix=url_prefix))]
+
+    stats = {'posts_modified': 0, 'posts_failed': 0, 'images': 0}
+    rewritten: Dict[str, str] = {}
+    print("🔄 Rewriting <img> tags...")
+    for post in posts:
+        new_content, post_stats = transform_post_content(post.content, replacers)
+        if new_content == post.content:
+            continue
+
+        print(f"   {post.title}: {post_stats['images']} image(s)")
+        stats['images'] += post_stats['images']
+        rewritten[post.document_id] = new_content
+
+        if DRY_RUN:
+            stats['posts_modified'] += 1
+        elif update_post(post.document_id, new_content):
+            stats['posts_modified'] += 1
+        else:
+            print(f"   ❌ Failed to update {post.title}")
+            stats['posts_failed'] += 1
+
+    if save_path:
+        save_posts_snapshot(save_path, [
+            {
+                'documentId': post.document_id,
+                'title': post.title,
+                'content': rewritten.get(post.document_id, post.content),
+            }
+            for post in posts
+        ])
+        print(f"\n📝 Wrote rewritten posts to {save_path}")
+
+    # Print summary
+    print("\n" + "=" * 60)
+    print("Summary")
+    print("=" * 60)
+    print(f"Source images: {len(sources)}")
+    print(f"Images failed: {len(failed)}")
+    print(f"New variant files: {created}")
+    print(f"Images rewritten: {stats['images']}")
+    print(f"Posts modified: {stats['posts_modified']}")
+    if not DRY_RUN:
+        print(f"Posts failed: {stats['posts_failed']}")
+
+    if DRY_RUN:
+        print("\n⚠️  This was a DRY RUN - Strapi was not changed")
+        print("   Run with --execute to apply changes")
+    else:
+        print("\n✅ Image rewrite complete!")
+
+
+if __name__ == '__main__':
+    main()
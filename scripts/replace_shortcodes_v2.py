@@ -7,8 +7,13 @@ import os
 import re
 import sys
 import json
+import hashlib
 import requests
-from typing import Dict, List, Optional, Tuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from requests.adapters import HTTPAdapter
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
 from urllib.parse import urlparse, parse_qs
 from dotenv import load_dotenv
 
@@ -22,6 +27,15 @@ SPOTIFY_SHOW_ID = os.getenv('SPOTIFY_SHOW_ID', '0xcYcgrzcnsff0mkNX0fGh')
 # Dry run mode - won't actually update Strapi
 DRY_RUN = True
 
+# Posts requested per page (Strapi's default maximum is 100)
+PAGE_SIZE = 100
+
+# Where the dry run writes its plan for `apply`
+DEFAULT_PLAN_PATH = 'shortcode-plan.json'
+
+# Number of concurrent update requests when applying a plan
+MAX_WORKERS = int(os.getenv('MAX_WORKERS', '8'))
+
 
 def extract_youtube_id(url: str) -> Optional[str]:
     """Extract YouTube video ID from various URL formats."""
@@ -206,63 +220,229 @@ def replace_intense_tabs(content: str) -> Tuple[str, int]:
     return content, count
 
 
-def transform_post_content(content: str) -> Tuple[str, Dict[str, int]]:
-    """Apply all shortcode replacements to content."""
-    stats = {}
+# Replacements applied by transform_post_content, in order, as
+# (stats key, function returning (new_content, count)) pairs
+SHORTCODE_REPLACERS: List[Tuple[str, Callable[[str], Tuple[str, int]]]] = [
+    ('podcast_subscribe', replace_podcast_subscribe),
+    ('youtube', replace_youtube_embeds),
+    ('audio', replace_audio_players),
+    ('intense_tabs', replace_intense_tabs),
+]
 
-    # Replace podcast subscribe buttons
-    content, count = replace_podcast_subscribe(content)
-    stats['podcast_subscribe'] = count
 
-    # Replace YouTube embeds
-    content, count = replace_youtube_embeds(content)
-    stats['youtube'] = count
+def transform_post_content(
+    content: str,
+    replacers: Optional[List[Tuple[str, Callable[[str], Tuple[str, int]]]]] = None,
+) -> Tuple[str, Dict[str, int]]:
+    """Apply all shortcode replacements to content.
 
-    # Replace audio players
-    content, count = replace_audio_players(content)
-    stats['audio'] = count
+    replacers defaults to SHORTCODE_REPLACERS; other stages can pass their
+    own (stats key, function) pairs to reuse the same rewrite pipeline.
+    """
+    stats = {}
 
-    # Replace intense tabs
-    content, count = replace_intense_tabs(content)
-    stats['intense_tabs'] = count
+    for name, replace in (SHORTCODE_REPLACERS if replacers is None else replacers):
+        content, count = replace(content)
+        stats[name] = count
 
     return content, stats
 
 
-def fetch_all_posts(slug_filter: Optional[str] = None) -> List[Dict]:
-    """Fetch all posts from Strapi, optionally filtered by slug pattern."""
-    if not STRAPI_API_TOKEN:
+def content_hash(content: str) -> str:
+    """Return a stable hash of post content for change detection."""
+    return hashlib.sha256((content or '').encode('utf-8')).hexdigest()
+
+
+class Post:
+    """Compact post record carried through the fetch, transform and write stages.
+
+    Holds only what the pipeline needs instead of the full Strapi response.
+    """
+    __slots__ = ('document_id', 'slug', 'title', 'content', 'content_hash')
+
+    def __init__(self, document_id: Optional[str], title: str, content: str, slug: Optional[str] = None):
+        self.document_id = document_id
+        self.slug = slug
+        self.title = title
+        self.content = content
+        self.content_hash = content_hash(content)
+
+    @classmethod
+    def from_strapi(cls, data: Dict) -> 'Post':
+        """Normalise a post from either Strapi 5 response shape."""
+        # Handle both Strapi 5 response formats (with or without attributes wrapper)
+        attrs = data.get('attributes', data)
+        return cls(
+            data.get('documentId'),
+            attrs.get('title', 'Untitled'),
+            attrs.get('content') or '',
+            attrs.get('slug'),
+        )
+
+
+def create_session(pool_size: int = 10) -> requests.Session:
+    """Create a session with a connection pool sized for concurrent requests."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def iter_post_pages(
+    slug_filter: Optional[str] = None,
+    base_url: Optional[str] = None,
+    api_token: Optional[str] = None,
+    session: Optional[requests.Session] = None,
+) -> Iterator[List[Dict]]:
+    """Yield pages of posts from Strapi, optionally filtered by slug pattern.
+
+    base_url and api_token default to STRAPI_URL and STRAPI_API_TOKEN.
+    """
+    base_url = base_url or STRAPI_URL
+    api_token = api_token or STRAPI_API_TOKEN
+    if not api_token:
         print("❌ Error: STRAPI_API_TOKEN not set in .env.server")
         sys.exit(1)
 
     headers = {
-        'Authorization': f'Bearer {STRAPI_API_TOKEN}',
+        'Authorization': f'Bearer {api_token}',
         'Content-Type': 'application/json'
     }
 
+    # Sort by id so rows cannot shift between pages while paging
+    url = f'{base_url}/api/posts?pagination[pageSize]={PAGE_SIZE}&sort=id:asc'
+
     # Use Strapi's filters for slug pattern
     if slug_filter:
-        url = f'{STRAPI_URL}/api/posts?pagination[pageSize]=300&filters[slug][$startsWith]={slug_filter}'
-    else:
-        url = f'{STRAPI_URL}/api/posts?pagination[pageSize]=300'
+        url += f'&filters[slug][$startsWith]={slug_filter}'
+
+    # Strapi caps pageSize (100 by default), so page through the results
+    # instead of relying on a single request returning everything
+    fetched = 0
+    page = 1
+    while True:
+        try:
+            response = (session or requests).get(f'{url}&pagination[page]={page}', headers=headers)
+            response.raise_for_status()
+            body = response.json()
+        except requests.exceptions.RequestException as e:
+            print(f"❌ Error fetching posts: {e}")
+            sys.exit(1)
+
+        posts = body.get('data', [])
+        fetched += len(posts)
+        pagination = body.get('meta', {}).get('pagination', {})
+        yield posts
+
+        if page >= pagination.get('pageCount', 1):
+            break
+        page += 1
+
+    total = pagination.get('total')
+    if total is not None and fetched != total:
+        print(f"❌ Error fetching posts: got {fetched} of {total} posts")
+        sys.exit(1)
+
+
+def fetch_all_posts(
+    slug_filter: Optional[str] = None,
+    base_url: Optional[str] = None,
+    api_token: Optional[str] = None,
+    session: Optional[requests.Session] = None,
+) -> List[Dict]:
+    """Fetch all posts from Strapi, optionally filtered by slug pattern.
+
+    base_url and api_token default to STRAPI_URL and STRAPI_API_TOKEN.
+    """
+    posts = []
+    for page in iter_post_pages(slug_filter, base_url, api_token, session):
+        posts.extend(page)
+    return posts
+
+
+def fetch_post_records(slug_filter: Optional[str] = None) -> Deque[Post]:
+    """Fetch all posts as Post records.
+
+    Each page is normalised as soon as it arrives, so at most one page of
+    raw API response is alive at a time.
+    """
+    records: Deque[Post] = deque()
+    for page in iter_post_pages(slug_filter):
+        records.extend(Post.from_strapi(post) for post in page)
+    return records
+
+
+def fetch_post(
+    document_id: str,
+    base_url: Optional[str] = None,
+    api_token: Optional[str] = None,
+    session: Optional[requests.Session] = None,
+    status: Optional[str] = None,
+) -> Optional[Dict]:
+    """Fetch a single post from Strapi by documentId.
+
+    base_url and api_token default to STRAPI_URL and STRAPI_API_TOKEN.
+    status ('draft' or 'published') selects a draft & publish version;
+    Strapi returns the published version when it is omitted.
+    """
+    headers = {
+        'Authorization': f'Bearer {api_token or STRAPI_API_TOKEN}',
+        'Content-Type': 'application/json'
+    }
+
+    url = f'{base_url or STRAPI_URL}/api/posts/{document_id}'
+    if status:
+        url += f'?status={status}'
 
     try:
-        response = requests.get(url, headers=headers)
+        response = (session or requests).get(url, headers=headers)
         response.raise_for_status()
-        return response.json().get('data', [])
+        return response.json().get('data')
     except requests.exceptions.RequestException as e:
-        print(f"❌ Error fetching posts: {e}")
-        sys.exit(1)
+        print(f"❌ Error fetching post {document_id}: {e}")
+        return None
 
 
-def update_post(document_id: str, content: str) -> bool:
-    """Update a post's content in Strapi."""
+def load_posts_snapshot(path: str) -> List[Dict]:
+    """Load posts from a local JSON snapshot of the Strapi posts endpoint."""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+
+    # Accept either the raw API response or a bare list of posts
+    if isinstance(data, dict):
+        return data.get('data', [])
+    return data
+
+
+def save_posts_snapshot(path: str, posts: List[Dict]) -> None:
+    """Write posts to a local JSON snapshot in the Strapi response shape."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'data': posts}, f, ensure_ascii=False, indent=2)
+
+
+def update_post(
+    document_id: str,
+    content: str,
+    base_url: Optional[str] = None,
+    api_token: Optional[str] = None,
+    session: Optional[requests.Session] = None,
+    status: Optional[str] = None,
+) -> bool:
+    """Update a post's content in Strapi.
+
+    base_url and api_token default to STRAPI_URL and STRAPI_API_TOKEN.
+    status ('draft' or 'published') selects which draft & publish version
+    is written.
+    """
     headers = {
-        'Authorization': f'Bearer {STRAPI_API_TOKEN}',
+        'Authorization': f'Bearer {api_token or STRAPI_API_TOKEN}',
         'Content-Type': 'application/json'
     }
 
-    url = f'{STRAPI_URL}/api/posts/{document_id}'
+    url = f'{base_url or STRAPI_URL}/api/posts/{document_id}'
+    if status:
+        url += f'?status={status}'
     payload = {
         'data': {
             'content': content
@@ -270,7 +450,7 @@ def update_post(document_id: str, content: str) -> bool:
     }
 
     try:
-        response = requests.put(url, json=payload, headers=headers)
+        response = (session or requests).put(url, json=payload, headers=headers)
         response.raise_for_status()
         return True
     except requests.exceptions.RequestException as e:
@@ -278,10 +458,125 @@ def update_post(document_id: str, content: str) -> bool:
         return False
 
 
+class PlanWriter:
+    """Streams the changed posts from a dry run to a plan file.
+
+    Entries are written as they are produced, so new content does not stay
+    in memory until the end of the run.
+    """
+
+    def __init__(self, path: str, slug_filter: Optional[str]):
+        self.path = path
+        self.count = 0
+        self._file = open(path, 'w', encoding='utf-8')
+        header = {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'strapi_url': STRAPI_URL,
+            'filter': slug_filter,
+        }
+        # Same layout as a plain json.dump of the plan, with posts last
+        self._file.write(json.dumps(header, ensure_ascii=False, indent=2)[:-2])
+        self._file.write(',\n  "posts": [')
+
+    def add(self, entry: Dict) -> None:
+        """Append one planned post."""
+        self._file.write(',\n    ' if self.count else '\n    ')
+        self._file.write(json.dumps(entry, ensure_ascii=False))
+        self.count += 1
+
+    def close(self) -> None:
+        """Finish the JSON document and close the file."""
+        self._file.write('\n  ]\n}\n' if self.count else ']\n}\n')
+        self._file.close()
+
+
+def apply_plan_entry(entry: Dict, session: requests.Session) -> str:
+    """Write one planned post if its live content still matches the plan.
+
+    Returns 'updated', 'applied' (live content already matches the plan),
+    'stale' (content changed since the dry run) or 'failed'.
+    """
+    data = fetch_post(entry['documentId'], session=session)
+    if not data:
+        return 'failed'
+
+    live_hash = Post.from_strapi(data).content_hash
+    if live_hash == content_hash(entry['content']):
+        return 'applied'
+    if live_hash != entry['base_hash']:
+        return 'stale'
+
+    if update_post(entry['documentId'], entry['content'], session=session):
+        return 'updated'
+    return 'failed'
+
+
+def apply_plan(path: str):
+    """Push exactly the posts recorded in a dry run plan."""
+    if not STRAPI_API_TOKEN:
+        print("❌ Error: STRAPI_API_TOKEN not set in .env.server")
+        sys.exit(1)
+
+    try:
+        with open(path, encoding='utf-8') as f:
+            plan = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"❌ Error reading plan {path}: {e}")
+        sys.exit(1)
+    entries = plan.get('posts', [])
+
+    print("=" * 60)
+    print("WordPress Shortcode Replacement (v2 - Apply Plan)")
+    print("=" * 60)
+    print(f"Plan: {path} (created {plan.get('created_at')})")
+    print(f"Strapi URL: {STRAPI_URL}")
+    if plan.get('strapi_url') != STRAPI_URL:
+        print(f"⚠️  Plan was created against {plan.get('strapi_url')}")
+    print(f"Posts in plan: {len(entries)}\n")
+
+    results = {'updated': 0, 'applied': 0, 'stale': 0, 'failed': 0}
+    session = create_session(MAX_WORKERS)
+
+    print("📤 Applying plan...")
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {executor.submit(apply_plan_entry, entry, session): entry for entry in entries}
+        for future in as_completed(futures):
+            entry = futures[future]
+            result = future.result()
+            results[result] += 1
+            if result == 'updated':
+                print(f"   ✅ {entry['title']}")
+            elif result == 'applied':
+                print(f"   ⏭️  {entry['title']} (already applied, skipped)")
+            elif result == 'stale':
+                print(f"   ⏭️  {entry['title']} (changed since dry run, skipped)")
+            else:
+                print(f"   ❌ {entry['title']}")
+
+    # Print summary
+    print("\n" + "=" * 60)
+    print("Summary")
+    print("=" * 60)
+    print(f"Posts updated: {results['updated']}")
+    print(f"Posts already applied: {results['applied']}")
+    print(f"Posts skipped (stale): {results['stale']}")
+    print(f"Posts failed: {results['failed']}")
+    if results['stale']:
+        print("\n⚠️  Some posts changed since the dry run - rerun the dry run to plan them again")
+
+
 def main():
     """Main transformation logic."""
     global DRY_RUN
 
+    # `apply <plan>` pushes a plan written by an earlier dry run
+    if len(sys.argv) > 1 and sys.argv[1] == 'apply':
+        if len(sys.argv) < 3:
+            print("Usage: replace_shortcodes_v2.py apply <plan.json>")
+            sys.exit(1)
+        apply_plan(sys.argv[2])
+        return
+
     # Check for --execute flag
     if '--execute' in sys.argv:
         DRY_RUN = False
@@ -290,12 +585,14 @@ def main():
         print("🔍 DRY RUN MODE: No changes will be made")
         print("   Run with --execute to apply changes\n")
 
-    # Check for --filter flag
+    # Check for --filter and --plan flags
     slug_filter = None
+    plan_path = DEFAULT_PLAN_PATH
     for i, arg in enumerate(sys.argv):
         if arg == '--filter' and i + 1 < len(sys.argv):
             slug_filter = sys.argv[i + 1]
-            break
+        elif arg == '--plan' and i + 1 < len(sys.argv):
+            plan_path = sys.argv[i + 1]
 
     print("=" * 60)
     print("WordPress Shortcode Replacement (v2 - Simple Markers)")
@@ -307,8 +604,9 @@ def main():
 
     # Fetch all posts
     print("📥 Fetching posts from Strapi...")
-    posts = fetch_all_posts(slug_filter)
-    print(f"   Found {len(posts)} posts\n")
+    posts = fetch_post_records(slug_filter)
+    total = len(posts)
+    print(f"   Found {total} posts\n")
 
     # Track statistics
     total_stats = {
@@ -320,27 +618,32 @@ def main():
         'audio': 0,
         'intense_tabs': 0
     }
+    plan = PlanWriter(plan_path, slug_filter) if DRY_RUN else None
 
     # Process each post
     print("🔄 Processing posts...")
-    for i, post in enumerate(posts, 1):
+    # Records are popped as they are processed so each one is released once
+    # its write is done
+    i = 0
+    while posts:
+        post = posts.popleft()
+        i += 1
+
         # Use documentId for Strapi 5 API
-        document_id = post.get('documentId')
-        if not document_id:
-            print(f"\n[{i}/{len(posts)}] ⚠️ Skipping post without documentId")
+        if not post.document_id:
+            print(f"\n[{i}/{total}] ⚠️ Skipping post without documentId")
             continue
 
-        # Handle both Strapi 5 response formats (with or without attributes wrapper)
-        attrs = post.get('attributes', post)
-        title = attrs.get('title', 'Untitled')
-        content = attrs.get('content', '')
+        document_id = post.document_id
+        title = post.title
+        content = post.content
 
         # Transform content
         new_content, stats = transform_post_content(content)
 
         # Check if content changed
         if new_content != content:
-            print(f"\n[{i}/{len(posts)}] {title}")
+            print(f"\n[{i}/{total}] {title}")
             print(f"   Changes:")
             for shortcode, count in stats.items():
                 if count > 0:
@@ -357,6 +660,13 @@ def main():
                     total_stats['posts_failed'] += 1
             else:
                 total_stats['posts_modified'] += 1
+                plan.add({
+                    'documentId': document_id,
+                    'title': title,
+                    'base_hash': post.content_hash,
+                    'content': new_content,
+                    'stats': stats,
+                })
 
         total_stats['posts_processed'] += 1
 
@@ -375,8 +685,11 @@ def main():
     print(f"  - [intense_tabs]: {total_stats['intense_tabs']}")
 
     if DRY_RUN:
+        plan.close()
+        print(f"\n📝 Wrote plan for {plan.count} post(s) to {plan_path}")
         print("\n⚠️  This was a DRY RUN - no changes were made")
-        print("   Run with --execute to apply changes")
+        print(f"   Run with 'apply {plan_path}' to push exactly this plan")
+        print("   or with --execute to transform and apply in one pass")
     else:
         print("\n✅ Shortcode replacement complete!")
 
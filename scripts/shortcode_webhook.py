@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Webhook service that replaces shortcodes in posts as they are created or edited.
+
+Strapi sends entry.create/entry.update/entry.publish webhooks to this service.
+Posts use draft & publish, so each event is processed against the version it
+refers to: saves touch the draft, publishes touch the published version. Each
+(documentId, version) is queued once, transformed with transform_post_content
+and written back, so new or edited posts never keep raw shortcodes.
+
+Configure a Strapi webhook (Settings > Webhooks) pointing at
+http://WEBHOOK_HOST:WEBHOOK_PORT/ with the Entry create/update/publish events,
+and an Authorization header of "Bearer WEBHOOK_SECRET" if a secret is set.
+"""
+import os
+import sys
+import json
+import hmac
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent))
+
+from replace_shortcodes_v2 import (  # noqa: E402
+    Post,
+    STRAPI_URL,
+    STRAPI_API_TOKEN,
+    content_hash,
+    create_session,
+    fetch_post,
+    transform_post_content,
+    update_post,
+)
+
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '127.0.0.1')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8787'))
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+
+# Strapi webhook events and content type handled by this service
+HANDLED_EVENTS = ('entry.create', 'entry.update', 'entry.publish')
+POST_MODEL = 'post'
+
+
+def entry_status(event: str, entry: Dict) -> str:
+    """Which draft & publish version a webhook refers to."""
+    if event == 'entry.publish' or entry.get('publishedAt'):
+        return 'published'
+    return 'draft'
+
+
+class DedupQueue:
+    """FIFO queue of (documentId, status) keys where each key is pending at most once."""
+
+    def __init__(self):
+        self._pending: 'OrderedDict[Tuple[str, str], None]' = OrderedDict()
+        self._condition = threading.Condition()
+
+    def put(self, key: Tuple[str, str]) -> bool:
+        """Queue a key. Returns False if it was already pending."""
+        with self._condition:
+            if key in self._pending:
+                return False
+            self._pending[key] = None
+            self._condition.notify()
+            return True
+
+    def get(self) -> Tuple[str, str]:
+        """Block until a key is available and return it."""
+        with self._condition:
+            while not self._pending:
+                self._condition.wait()
+            key, _ = self._pending.popitem(last=False)
+            return key
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._pending)
+
+
+class WrittenContent:
+    """Remembers the content hash this service last wrote for each post.
+
+    Strapi fires entry.update for our own writes; a webhook whose content
+    matches what we wrote is ignored instead of being queued again.
+    """
+
+    def __init__(self):
+        self._hashes: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def record(self, document_id: str, content: str) -> None:
+        with self._lock:
+            self._hashes[document_id] = content_hash(content)
+
+    def forget(self, document_id: str) -> None:
+        with self._lock:
+            self._hashes.pop(document_id, None)
+
+    def is_own_write(self, document_id: str, content: Optional[str]) -> bool:
+        if content is None:
+            return False
+        with self._lock:
+            return self._hashes.get(document_id) == content_hash(content)
+
+
+queue = DedupQueue()
+written = WrittenContent()
+session = create_session()
+
+
+def process_post(document_id: str, status: str) -> None:
+    """Fetch a post version, replace its shortcodes and write it back if it changed."""
+    data = fetch_post(document_id, session=session, status=status)
+    if not data:
+        return
+    post = Post.from_strapi(data)
+
+    if written.is_own_write(document_id, post.content):
+        return
+
+    new_content, stats = transform_post_content(post.content)
+    if new_content == post.content:
+        return
+
+    changes = ', '.join(f'{name}: {count}' for name, count in stats.items() if count > 0)
+    print(f"🔄 {post.title} ({document_id}, {status}) - {changes}")
+
+    # Record before writing: Strapi may deliver the update webhook before the
+    # PUT request returns
+    written.record(document_id, new_content)
+    if update_post(document_id, new_content, session=session, status=status):
+        print(f"   ✅ Updated in Strapi")
+    else:
+        written.forget(document_id)
+        print(f"   ❌ Failed to update")
+
+
+def worker() -> None:
+    """Process queued posts one at a time."""
+    while True:
+        document_id, status = queue.get()
+        try:
+            process_post(document_id, status)
+        except Exception as e:
+            print(f"❌ Error processing post {document_id}: {e}")
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    """Accepts Strapi entry webhooks and queues affected posts."""
+
+    def do_POST(self):
+        authorization = self.headers.get('Authorization', '')
+        if WEBHOOK_SECRET and not hmac.compare_digest(
+            authorization.encode('utf-8'), f'Bearer {WEBHOOK_SECRET}'.encode('utf-8')
+        ):
+            self.respond(401, {'error': 'unauthorized'})
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except (ValueError, json.JSONDecodeError):
+            self.respond(400, {'error': 'invalid JSON'})
+            return
+
+        if not isinstance(payload, dict) or not isinstance(payload.get('entry') or {}, dict):
+            self.respond(400, {'error': 'expected a JSON object'})
+            return
+
+        event = payload.get('event')
+        entry = payload.get('entry') or {}
+        document_id = entry.get('documentId')
+
+        if event not in HANDLED_EVENTS or payload.get('model') != POST_MODEL or not document_id:
+            self.respond(200, {'status': 'ignored'})
+            return
+
+        if written.is_own_write(document_id, entry.get('content')):
+            self.respond(200, {'status': 'ignored', 'reason': 'own write'})
+            return
+
+        queued = queue.put((document_id, entry_status(event, entry)))
+        self.respond(202, {'status': 'queued' if queued else 'already queued'})
+
+    def respond(self, status: int, body: Dict) -> None:
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Keep output to processed posts only
+        pass
+
+
+def main():
+    """Run the webhook service until interrupted."""
+    if not STRAPI_API_TOKEN:
+        print("❌ Error: STRAPI_API_TOKEN not set in .env.server")
+        sys.exit(1)
+
+    print("=" * 60)
+    print("Shortcode Replacement Webhook Service")
+    print("=" * 60)
+    print(f"Strapi URL: {STRAPI_URL}")
+    print(f"Listening on: http://{WEBHOOK_HOST}:{WEBHOOK_PORT}/")
+    if not WEBHOOK_SECRET:
+        print("⚠️  WEBHOOK_SECRET not set - accepting unauthenticated webhooks")
+    print()
+
+    threading.Thread(target=worker, daemon=True).start()
+
+    server = ThreadingHTTPServer((WEBHOOK_HOST, WEBHOOK_PORT), WebhookHandler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Shutting down")
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Replicate transformed post content from one Strapi instance to another.
+
+Compares content hashes by slug between a source (e.g. beta) and a target
+(e.g. prod) instance and pushes only the posts whose content differs, so
+promoting a migration does not require re-running the full transform.
+"""
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent))
+
+from replace_shortcodes_v2 import (  # noqa: E402
+    Post,
+    STRAPI_URL,
+    STRAPI_API_TOKEN,
+    create_session,
+    fetch_all_posts,
+    update_post,
+)
+
+SOURCE_STRAPI_URL = os.getenv('SOURCE_STRAPI_URL', STRAPI_URL)
+SOURCE_STRAPI_API_TOKEN = os.getenv('SOURCE_STRAPI_API_TOKEN', STRAPI_API_TOKEN)
+TARGET_STRAPI_URL = os.getenv('TARGET_STRAPI_URL')
+TARGET_STRAPI_API_TOKEN = os.getenv('TARGET_STRAPI_API_TOKEN')
+
+# Number of concurrent update requests against the target
+MAX_WORKERS = int(os.getenv('SYNC_MAX_WORKERS', '8'))
+
+# Dry run mode - won't actually update the target
+DRY_RUN = True
+
+
+def index_by_slug(posts: List[Dict]) -> Dict[str, Post]:
+    """Map slug to a Post record."""
+    index = {}
+    for data in posts:
+        post = Post.from_strapi(data)
+        if post.slug:
+            index[post.slug] = post
+    return index
+
+
+def diff_posts(source: Dict[str, Post], target: Dict[str, Post]) -> Tuple[List[Tuple[str, Post, Post]], List[str]]:
+    """Return (changed, missing): posts whose content differs, and slugs absent from the target."""
+    changed = []
+    missing = []
+    for slug, src in source.items():
+        dst = target.get(slug)
+        if dst is None:
+            missing.append(slug)
+        elif dst.document_id and src.content_hash != dst.content_hash:
+            changed.append((slug, src, dst))
+    return changed, missing
+
+
+def get_arg(flag: str) -> Optional[str]:
+    """Return the value following a command line flag, if present."""
+    for i, arg in enumerate(sys.argv):
+        if arg == flag and i + 1 < len(sys.argv):
+            return sys.argv[i + 1]
+    return None
+
+
+def main():
+    """Main sync logic."""
+    global DRY_RUN
+
+    # Check for --execute flag
+    if '--execute' in sys.argv:
+        DRY_RUN = False
+        print("⚠️  LIVE MODE: Changes will be written to the target Strapi")
+    else:
+        print("🔍 DRY RUN MODE: No changes will be made")
+        print("   Run with --execute to apply changes\n")
+
+    source_url = get_arg('--source') or SOURCE_STRAPI_URL
+    target_url = get_arg('--target') or TARGET_STRAPI_URL
+    slug_filter = get_arg('--filter')
+
+    if not target_url or not TARGET_STRAPI_API_TOKEN:
+        print("❌ Error: TARGET_STRAPI_URL and TARGET_STRAPI_API_TOKEN must be set in .env.server")
+        sys.exit(1)
+
+    print("=" * 60)
+    print("Strapi Content Sync (changed posts only)")
+    print("=" * 60)
+    print(f"Source: {source_url}")
+    print(f"Target: {target_url}")
+    if slug_filter:
+        print(f"Filter: slugs starting with '{slug_filter}'")
+    print()
+
+    session = create_session(MAX_WORKERS)
+
+    # Fetch both sides concurrently
+    print("📥 Fetching posts from source and target...")
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        source_future = executor.submit(
+            fetch_all_posts, slug_filter, source_url, SOURCE_STRAPI_API_TOKEN, session
+        )
+        target_future = executor.submit(
+            fetch_all_posts, slug_filter, target_url, TARGET_STRAPI_API_TOKEN, session
+        )
+        source = index_by_slug(source_future.result())
+        target = index_by_slug(target_future.result())
+    print(f"   Source: {len(source)} posts")
+    print(f"   Target: {len(target)} posts\n")
+
+    changed, missing = diff_posts(source, target)
+
+    print(f"🔄 {len(changed)} post(s) differ")
+    for slug, src, _ in changed:
+        print(f"   - {src.title} ({slug})")
+
+    if missing:
+        print(f"\n⚠️  {len(missing)} post(s) missing on target (not created):")
+        for slug in missing:
+            print(f"   - {slug}")
+
+    updated = 0
+    failed = 0
+    if changed and not DRY_RUN:
+        print(f"\n📤 Pushing {len(changed)} post(s) to target...")
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            futures = {
+                executor.submit(
+                    update_post, dst.document_id, src.content,
+                    target_url, TARGET_STRAPI_API_TOKEN, session
+                ): slug
+                for slug, src, dst in changed
+            }
+            for future in as_completed(futures):
+                if future.result():
+                    print(f"   ✅ {futures[future]}")
+                    updated += 1
+                else:
+                    print(f"   ❌ {futures[future]}")
+                    failed += 1
+
+    # Print summary
+    print("\n" + "=" * 60)
+    print("Summary")
+    print("=" * 60)
+    print(f"Posts compared: {len(source)}")
+    print(f"Posts unchanged: {len(source) - len(changed) - len(missing)}")
+    print(f"Posts differing: {len(changed)}")
+    print(f"Posts missing on target: {len(missing)}")
+    if not DRY_RUN:
+        print(f"Posts updated: {updated}")
+        print(f"Posts failed: {failed}")
+
+    if DRY_RUN:
+        print("\n⚠️  This was a DRY RUN - no changes were made")
+        print("   Run with --execute to apply changes")
+    else:
+        print("\n✅ Sync complete!")
+
+
+if __name__ == '__main__':
+    main()